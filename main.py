@@ -9,25 +9,44 @@
 
 import sqlite3
 import os.path
+import sys
 import requests
-from bs4 import BeautifulSoup
-import re
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+# Scraped columns that hold text or whole numbers; every other statistic is stored as REAL
+TEXT_COLS = {"Player", "Pos", "Tm"}
+INTEGER_COLS = {"Age", "G", "GS"}
+CONVERTERS = {"TEXT": str, "INTEGER": int, "REAL": float}
+
+# Headers that are not stored as statistic columns in the players table
+EXCLUDED_HEADERS = frozenset(["Player", "Tm"])
+
+# Translation table that strips every non-word character from column headers
+NON_WORD = str.maketrans('', '', ''.join(chr(c) for c in range(128) if not (chr(c).isalnum() or chr(c) == '_')))
+
+# Shared HTTP session so connections to basketball-reference.com are reused between requests
+SESSION = requests.Session()
+
+@lru_cache(maxsize=16)
 def scrape_nba_player_data(year):
     """
     Scrapes NBA player data from basketball-reference.com for the specified year.
+    Results are cached, so each year is only fetched and parsed once.
 
     Parameters:
         year (int): The year for which to scrape the data.
 
     Returns:
-        sanitized_headers (list): A list of sanitized column headers.
-        player_data (list): A list of lists containing player information.
+        sanitized_headers (tuple): A tuple of sanitized column headers.
+        player_data (tuple): A tuple of tuples containing player information.
     """
 
     url = f"https://www.basketball-reference.com/leagues/NBA_{year}_per_game.html"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
+    response = SESSION.get(url)
+    # Only build the stats table instead of the whole page
+    soup = BeautifulSoup(response.content, "lxml", parse_only=SoupStrainer("table", {"id": "per_game_stats"}))
 
     table = soup.find("table", {"id": "per_game_stats"})
 
@@ -36,7 +55,7 @@ def scrape_nba_player_data(year):
 
     sanitized_headers = []
     for header in headers:
-        sanitized_header = re.sub(r'\W+', '', header)
+        sanitized_header = header.translate(NON_WORD)
         if sanitized_header[0].isdigit():
             sanitized_header = "_" + sanitized_header
         sanitized_headers.append(sanitized_header)
@@ -47,7 +66,8 @@ def scrape_nba_player_data(year):
         player_info = [td.getText() for td in row.findAll("td")]
         player_data.append(player_info)
 
-    return sanitized_headers, player_data
+    # Return immutable copies since the cached result is shared between callers
+    return tuple(sanitized_headers), tuple(map(tuple, player_data))
 
 def create_nba_database(headers, player_data, year):
     """
@@ -57,8 +77,8 @@ def create_nba_database(headers, player_data, year):
     Renames columns for better clarity.
 
     Parameters:
-        headers (list): A list of sanitized column headers.
-        player_data (list): A list of lists containing player information.
+        headers (tuple): A tuple of sanitized column headers.
+        player_data (tuple): A tuple of tuples containing player information.
         year (int): The year for which to create the database.
     """
 
@@ -66,43 +86,47 @@ def create_nba_database(headers, player_data, year):
 
     if not os.path.isfile(db_file):  # Check if the database file exists
         conn = sqlite3.connect(db_file)
+        # Tune the connection for the bulk load: WAL journaling, fewer fsyncs and a 64MB page cache
+        conn.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536;")
         cursor = conn.cursor()
 
+        # Each statistic value follows the scraped column order, so its type comes from the header of the value
+        # rather than the (shifted) name of the column it is stored under
+        column_types = [
+            "TEXT" if header in TEXT_COLS else "INTEGER" if header in INTEGER_COLS else "REAL"
+            for header in headers[2:]
+        ]
+        stat_columns = [header for header in headers if header not in EXCLUDED_HEADERS]
+
         # Create a table for player data
         create_table_query = f"""
         CREATE TABLE IF NOT EXISTS players (
             player_name TEXT,
             player_team TEXT,
-            {", ".join([f'{header} TEXT' for header in headers if header not in ['Player', 'Tm']])},
+            {", ".join([f'{header} {column_type}' for header, column_type in zip(stat_columns, column_types)])},
             PER REAL,
             PRIMARY KEY (player_name, player_team)
         )
         """
         cursor.execute(create_table_query)
 
-        # Insert player data into the table
-        for player_info in player_data:
-            # Check if the player_info is empty or incomplete
-            if len(player_info) < 2:
-                continue
-            
-            # Split player data into player name, team name, and statistics
-            player_name, player_team = player_info[:2]
-
-            # Check if the record already exists in the database
-            cursor.execute("SELECT COUNT(*) FROM players WHERE player_name = ? AND player_team = ?", (player_name, player_team))
-            if cursor.fetchone()[0] == 0:  # If the record does not exist, insert it
-                player_stats = player_info[2:]
-
-                # Fill missing values with 0
-                player_stats_filled = [stat if stat else '0' for stat in player_stats]
-
-                # Generate insert query dynamically based on the number of columns in player data
-                insert_query = f"""
-                INSERT INTO players (player_name, player_team, {", ".join([header for header in headers if header not in ['Player', 'Tm']])}, PER)
-                VALUES (?, ?, {", ".join(["?" for _ in player_stats_filled])}, ?)
-                """
-                cursor.execute(insert_query, [player_name, player_team] + player_stats_filled + [0])  # Initialize PER to 0
+        # Split player data into player name, team name, and statistics, filling missing values with 0,
+        # converting each statistic to its column type and initializing PER to 0. Empty or incomplete rows are skipped.
+        rows = [
+            [
+                player_info[0], player_info[1],
+                *[CONVERTERS[column_type](stat if stat else '0') for stat, column_type in zip(player_info[2:], column_types)],
+                0
+            ]
+            for player_info in player_data if len(player_info) >= 2
+        ]
+
+        # Insert all players in a single transaction; duplicate records are dropped by the primary key
+        columns = ", ".join(["player_name", "player_team", *stat_columns, "PER"])
+        placeholders = ", ".join("?" * (len(stat_columns) + 3))
+        insert_query = f"INSERT OR IGNORE INTO players ({columns}) VALUES ({placeholders})"
+        with conn:
+            cursor.executemany(insert_query, rows)
 
         # Rename columns
         cursor.execute('ALTER TABLE players RENAME COLUMN player_team TO Position')
@@ -110,6 +134,9 @@ def create_nba_database(headers, player_data, year):
         cursor.execute('ALTER TABLE players RENAME COLUMN Pos TO Age')
         
         conn.commit()
+
+        # Switch back to the default rollback journal so the saved database is a single file
+        conn.execute("PRAGMA journal_mode=DELETE")
         conn.close()
         print(f"NBA database for {year} created successfully!")
     else:
@@ -124,43 +151,26 @@ def PER_calculator(year):
         year (int): The year for which to calculate PER.
     """
 
-    headers, player_data = scrape_nba_player_data(year)
-
-    # Fetch player data from the database
     db_file = f"nba_database_{year}.db"
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM players")
-    player_records = cursor.fetchall()
-
-    for player_record in player_records:
-        # Extract relevant statistics
-        minutes_played = float(player_record[6])
-        points = float(player_record[28])
-        assists = float(player_record[23])
-        defensive_rebounds = float(player_record[21])
-        offensive_rebounds = float(player_record[20])
-        steals = float(player_record[24])
-        blocks = float(player_record[25])
-        two_pointers_made = float(player_record[13])
-        three_pointers_made = float(player_record[10])
-        two_pointers_attempted = float(player_record[14])
-        three_pointers_attempted = float(player_record[11])
-        turnovers = float(player_record[26])
-        personal_fouls = float(player_record[27])
-
-        # Calculate PER
-        PER = (
-            points + assists + (defensive_rebounds / 2) + offensive_rebounds +
-            (steals * 2) + (blocks * 2) + two_pointers_made +
-            (three_pointers_made * 2)
-        ) - (
-            (two_pointers_attempted / 2) + three_pointers_attempted +
-            (turnovers * 2) + (personal_fouls / 3)
-        ) / minutes_played
-
-        # Update the database with the calculated PER
-        cursor.execute("UPDATE players SET PER = ? WHERE player_name = ? AND Position = ?", (PER, player_record[0], player_record[1]))
+
+    # Calculate PER for every player in a single statement. A player with no minutes played gets a PER of 0.
+    cursor.execute("""
+    UPDATE players SET PER = COALESCE(((
+        PTS + AST + (DRB / 2) + ORB +
+        (STL * 2) + (BLK * 2) + _2P +
+        (_3P * 2)
+    ) - (
+        (_2PA / 2) + _3PA +
+        (TOV * 2) + (PF / 3)
+    )) / NULLIF(MP, 0), 0)
+    """)
+
+    # Index the ranking columns used by the top player reports and refresh the query planner statistics
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tm_per ON players (Tm, PER DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pos_per ON players (Position, PER DESC)")
+    cursor.execute("ANALYZE players")
 
     conn.commit()
     conn.close()
@@ -179,33 +189,38 @@ def print_top_players(year):
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
-    # Fetch players who played over 50 games and their PER
-    cursor.execute("SELECT player_name, Position, PER FROM players WHERE G >= 50")
-    player_records = cursor.fetchall()
+    # Fetch the top 10 players at each position among players who played over 50 games
+    cursor.execute("""
+    SELECT player_name, Position, PER, rank FROM (
+        SELECT player_name, Position, PER, ROW_NUMBER() OVER (PARTITION BY Position ORDER BY PER DESC) AS rank
+        FROM players WHERE G >= 50
+    )
+    WHERE rank <= 10
+    ORDER BY Position, rank
+    """)
 
-    # Organize players by position
-    players_by_position = {}
-    for player_record in player_records:
-        player_name, position, per = player_record
-        if position not in players_by_position:
-            players_by_position[position] = []
-        players_by_position[position].append((player_name, per))
+    # Collect the report lines and write them out at once
+    lines = []
 
     # Print top 10 players at each position
-    print(f"Top 10 Players for {year} at Each Position:")
-    for position, players in players_by_position.items():
-        players_sorted = sorted(players, key=lambda x: x[1], reverse=True)[:10]
-        print(f"{position}:")
-        for i, (player_name, per) in enumerate(players_sorted):
-            print(f"{i+1}. {player_name} (PER: {per:.2f})")
-        print()
+    lines.append(f"Top 10 Players for {year} at Each Position:")
+    current_position = None
+    for player_name, position, per, rank in cursor:
+        if position != current_position:
+            if current_position is not None:
+                lines.append("")
+            lines.append(f"{position}:")
+            current_position = position
+        lines.append(f"{rank}. {player_name} (PER: {per:.2f})")
+    lines.append("")
 
     # Print top 75 players overall
-    print(f"Top 75 Players for {year} Overall:")
-    all_players = [(player_name, per) for players in players_by_position.values() for player_name, per in players]
-    all_players_sorted = sorted(all_players, key=lambda x: x[1], reverse=True)[:75]
-    for i, (player_name, per) in enumerate(all_players_sorted):
-        print(f"{i+1}. {player_name} (PER: {per:.2f})")
+    lines.append(f"Top 75 Players for {year} Overall:")
+    cursor.execute("SELECT player_name, PER FROM players WHERE G >= 50 ORDER BY PER DESC LIMIT 75")
+    for i, (player_name, per) in enumerate(cursor, start=1):
+        lines.append(f"{i}. {player_name} (PER: {per:.2f})")
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
     conn.close()
 
@@ -222,19 +237,32 @@ def print_top_players_by_team(year):
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
-    # Fetch all teams
-    cursor.execute("SELECT DISTINCT Tm FROM players")
-    teams = [team[0] for team in cursor.fetchall()]
+    # Fetch the top 5 players on each team
+    cursor.execute("""
+    SELECT Tm, player_name, PER, G, GS, rank FROM (
+        SELECT Tm, player_name, PER, G, GS, ROW_NUMBER() OVER (PARTITION BY Tm ORDER BY PER DESC) AS rank
+        FROM players
+    )
+    WHERE rank <= 5
+    ORDER BY Tm, rank
+    """)
+
+    # Collect the report lines and write them out at once
+    lines = []
 
     # Print top 5 players on each team
-    print(f"Top 5 Players by Team for {year}:")
-    for team in teams:
-        print(f"Team: {team}")
-        cursor.execute("SELECT player_name, PER, G, GS FROM players WHERE Tm = ? ORDER BY PER DESC LIMIT 5", (team,))
-        players = cursor.fetchall()
-        for i, (player_name, per, games_played, games_started) in enumerate(players, start=1):
-            print(f"{i}. {player_name} (PER: {per:.2f}, Games Played: {games_played}, Games Started: {games_started})")
-        print()
+    lines.append(f"Top 5 Players by Team for {year}:")
+    current_team = None
+    for team, player_name, per, games_played, games_started, rank in cursor:
+        if team != current_team:
+            if current_team is not None:
+                lines.append("")
+            lines.append(f"Team: {team}")
+            current_team = team
+        lines.append(f"{rank}. {player_name} (PER: {per:.2f}, Games Played: {games_played}, Games Started: {games_started})")
+    lines.append("")
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
     conn.close()
 
@@ -242,11 +270,14 @@ def main():
     # Note: I've created databases for 2020-Present but only kept 2024 as each year has a large amount of output
     # If you're curious, I've still kept the databases for browsing purposes. (Sorting by PER is interesting)
     years = [2024]  # List of years to scrape data for
-    for year in years:
-        headers, player_data = scrape_nba_player_data(year)
-        create_nba_database(headers, player_data, year)
-        PER_calculator(year)
-        #print_top_players(year)
-        #print_top_players_by_team(year)
+
+    # Scrape all years concurrently since each scrape spends most of its time waiting on the network.
+    # Results are consumed in order, so years before a failed scrape are still written to their databases.
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(years)))) as executor:
+        for year, (headers, player_data) in zip(years, executor.map(scrape_nba_player_data, years)):
+            create_nba_database(headers, player_data, year)
+            PER_calculator(year)
+            #print_top_players(year)
+            #print_top_players_by_team(year)
 
 main()
\ No newline at end of file